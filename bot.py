@@ -1,217 +1,262 @@
+import asyncio
 import discord
 from discord.ext import commands
+import functools
+import os
 import random
 import json
-import string
-from collections import Counter
+import time
 
-# Remove the default help command so we can use our custom one
+from puzzle import Puzzle
+
+# Discord still delivers the content of messages that mention the bot, so a
+# mention prefix works without the privileged MESSAGE_CONTENT intent -- and
+# without the gateway delivering every message in every channel just so we
+# can check it for a '!' prefix.
 intents = discord.Intents.default()
-intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents, activity=discord.Game(name="Codebusters"))
+bot = commands.Bot(command_prefix=commands.when_mentioned, intents=intents, activity=discord.Game(name="Codebusters"))
 bot.remove_command("help")  # Removes the default built-in help command
 
+QUOTES_FILE = 'quotes.jsonl'
+LEGACY_QUOTES_FILE = 'quotes.json'
+
 def load_quotes():
     try:
-        with open('quotes.json', 'r') as f:
-            return json.load(f)
+        with open(QUOTES_FILE, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        pass
+    # One-time migration from the old whole-file quotes.json format
+    try:
+        with open(LEGACY_QUOTES_FILE, 'r') as f:
+            quotes = json.load(f)
     except FileNotFoundError:
         return []
+    with open(QUOTES_FILE, 'w') as f:
+        for quote in quotes:
+            f.write(json.dumps(quote) + '\n')
+    return quotes
+
+def append_quote(quote):
+    with open(QUOTES_FILE, 'a') as f:
+        f.write(json.dumps(quote) + '\n')
 
-def save_quotes(quotes):
-    with open('quotes.json', 'w') as f:
-        json.dump(quotes, f)
+# Quote database lives in memory; disk is only touched to append new quotes
+QUOTES = load_quotes()
 
 # Store active puzzles for different users
 active_puzzles = {}
 
-class Puzzle:
-    def __init__(self, plaintext):
-        self.plaintext = plaintext.lower()
-        self.cipher_mapping = {}
-        self.user_guesses = {}
-        self.generate_cipher()
-    
-    def generate_cipher(self):
-        alphabet = list(string.ascii_lowercase)
-        shuffled = list(string.ascii_uppercase)
-        random.shuffle(shuffled)
-        self.cipher_mapping = dict(zip(alphabet, shuffled))
-    
-    def get_ciphertext(self):
-        return ''.join(self.cipher_mapping.get(c, c) for c in self.plaintext)
-    
-    def get_current_guess(self):
-        """
-        Return a string showing underscores for unguessed letters,
-        and the correct lowercase letter for any correctly guessed letters.
-        Non-alpha chars remain as-is.
-        """
-        ciphertext = self.get_ciphertext()
-        result = []
-        for char in ciphertext:
-            if char.isalpha() and char in self.user_guesses:
-                result.append(self.user_guesses[char])
-            elif char.isalpha():
-                result.append('_')
-            else:
-                result.append(char)
-        return ''.join(result)
-    
-    def make_guess(self, cipher_char, plain_char):
-        """
-        Checks if cipher_char (uppercase) actually maps to plain_char (lowercase).
-        If correct, store in user_guesses and return True, otherwise False.
-        """
-        if not (cipher_char.isupper() and plain_char.islower()):
-            return False
-
-        # Identify correct plaintext letter for this cipher_char from cipher_mapping
-        for real_plain_char, mapped_cipher_char in self.cipher_mapping.items():
-            if mapped_cipher_char == cipher_char:
-                if real_plain_char == plain_char:
-                    self.user_guesses[cipher_char] = plain_char
-                    return True
-                else:
-                    return False
-        return False
-    
-    def undo_guess(self, cipher_char):
-        """
-        Removes a single-letter guess if it exists in user_guesses.
-        """
-        if cipher_char in self.user_guesses:
-            del self.user_guesses[cipher_char]
-            return True
-        return False
-    
-    def clear_guesses(self):
-        """
-        Clears all guesses.
-        """
-        self.user_guesses.clear()
-    
-    def is_solved(self):
-        """
-        Returns True if the user's current guess matches the original plaintext exactly.
-        """
-        return (self.get_current_guess() == self.plaintext)
-    
-    def give_hint(self):
-        """
-        Reveals ONE random letter that hasn't been guessed yet.
-        Returns (cipher_char, plain_char) if a letter was revealed, or None if no hint is possible.
-        """
-        ciphertext = self.get_ciphertext()
-        
-        # Build a list of cipher characters that are not yet guessed
-        unguessed = []
-        for cipher_char in ciphertext:
-            if cipher_char.isalpha() and cipher_char not in self.user_guesses:
-                unguessed.append(cipher_char)
-        
-        if not unguessed:
-            return None  # No letters to reveal
-        
-        # Randomly choose one unguessed cipher character
-        chosen_cipher = random.choice(unguessed)
-        
-        # Figure out the correct plaintext letter for that cipher character
-        for real_plain_char, mapped_cipher_char in self.cipher_mapping.items():
-            if mapped_cipher_char == chosen_cipher:
-                # Reveal that letter
-                self.user_guesses[chosen_cipher] = real_plain_char
-                return (chosen_cipher, real_plain_char)
-        
-        return None
+# Bot-level RNG for quote selection; puzzles carry their own instance so
+# nothing shares the module-global Mersenne Twister state (reproducible in
+# tests, and safe if handlers ever run off-thread).
+_bot_rng = random.Random()
+
+# Quotes are dealt from a shuffled bag of indices so no quote repeats until
+# every quote has been used once. The bag is rebuilt when it empties, which
+# also picks up any quotes added since the last shuffle.
+_quote_bag = []
+
+def next_quote():
+    if not _quote_bag:
+        _quote_bag.extend(range(len(QUOTES)))
+        _bot_rng.shuffle(_quote_bag)
+    return QUOTES[_quote_bag.pop()]
+
+# Rapid successive guesses are coalesced: each one (re)arms a short timer
+# and only the last guess in a burst actually sends the embed, saving REST
+# calls and rate-limit budget for fast typists.
+GUESS_BATCH_DELAY = float(os.environ.get('GUESS_BATCH_DELAY_SECONDS', '0.6'))
+_pending_refresh = {}
+
+# Puzzles abandoned for this long are evicted so active_puzzles (and process
+# memory) stays bounded on long-lived bots
+PUZZLE_TTL = 3600  # seconds since last command
+PUZZLE_SWEEP_INTERVAL = 300
+
+# Command bodies run on a bounded worker pool instead of directly on the
+# dispatch path. If a send stalls (rate-limit backoff, slow network) it ties
+# up one worker rather than queueing unbounded tasks; when the queue is full
+# we drop the command with a notice instead of falling further behind.
+WORK_QUEUE_SIZE = 256
+WORKER_COUNT = 8
+WORKER_TIMEOUT = 30  # seconds allowed per command
+
+work_q = asyncio.Queue(maxsize=WORK_QUEUE_SIZE)
+dropped_commands = 0
+
+async def evict_stale_puzzles():
+    while True:
+        await asyncio.sleep(PUZZLE_SWEEP_INTERVAL)
+        cutoff = time.monotonic() - PUZZLE_TTL
+        for user_id, puzzle in list(active_puzzles.items()):
+            if puzzle.last_touch < cutoff:
+                cancel_pending_refresh(user_id)
+                del active_puzzles[user_id]
+
+async def worker():
+    while True:
+        handler, ctx, args, kwargs = await work_q.get()
+        try:
+            async with asyncio.timeout(WORKER_TIMEOUT):
+                await handler(ctx, *args, **kwargs)
+        except Exception as exc:
+            print(f'Error running {handler.__name__}: {exc!r}')
+        finally:
+            work_q.task_done()
+
+def queued(handler):
+    """
+    Wraps a command body so the callback just enqueues it for the worker pool.
+    """
+    @functools.wraps(handler)
+    async def enqueue(ctx, *args, **kwargs):
+        global dropped_commands
+        try:
+            # discord.py passes consume-rest parameters (solve/addquote)
+            # as keyword arguments, so those must ride along too
+            work_q.put_nowait((handler, ctx, args, kwargs))
+        except asyncio.QueueFull:
+            dropped_commands += 1
+            print(f'Work queue full, dropped command ({dropped_commands} total)')
+            await ctx.send("The bot is overloaded right now, please try again in a moment.")
+    return enqueue
+
+# Deletion table for normalizing solve attempts: strips every non-alnum
+# BMP codepoint in a single str.translate pass, matching the isalnum
+# filter used to build plaintext_norm (quotes contain non-ASCII
+# punctuation like curly apostrophes, which ASCII-only stripping missed).
+_DEL_TABLE = dict.fromkeys(i for i in range(0x10000) if not chr(i).isalnum())
+
+class SingleAlpha(commands.Converter):
+    """
+    Accepts exactly one alphabetic character, rejecting anything else at
+    argument-parse time so bad input never reaches the Puzzle.
+    """
+    async def convert(self, ctx, argument):
+        if len(argument) == 1 and argument.isalpha():
+            return argument
+        raise commands.BadArgument("Expected a single letter.")
+
+workers_started = False
 
 @bot.event
 async def on_ready():
+    global workers_started
+    if not workers_started:
+        workers_started = True
+        for _ in range(WORKER_COUNT):
+            asyncio.create_task(worker())
+        asyncio.create_task(evict_stale_puzzles())
     print(f'{bot.user} has connected to Discord!')
 
 @bot.command(name='newpuzzle')
+@queued
 async def new_puzzle(ctx):
-    quotes = load_quotes()
-    if not quotes:
+    if not QUOTES:
         await ctx.send("No quotes available in the database!")
         return
-    
-    quote = random.choice(quotes)
+
+    quote = next_quote()
     puzzle = Puzzle(quote)
+    puzzle.embed = build_puzzle_embed(puzzle)
+    cancel_pending_refresh(ctx.author.id)
     active_puzzles[ctx.author.id] = puzzle
-    
+
     await display_puzzle(ctx)
 
 @bot.command(name='guess')
-async def guess(ctx, cipher_char: str, plain_char: str):
+@queued
+async def guess(ctx, cipher_char: SingleAlpha, plain_char: SingleAlpha):
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
-    
+    puzzle.last_touch = time.monotonic()
+
     success = puzzle.make_guess(cipher_char.upper(), plain_char.lower())
     if success:
         if puzzle.is_solved():
+            cancel_pending_refresh(ctx.author.id)
             await ctx.send("Congratulations! You've correctly solved the entire puzzle!")
             del active_puzzles[ctx.author.id]
         else:
-            await display_puzzle(ctx)
+            schedule_display(ctx)
     else:
         await ctx.send("Incorrect guess or invalid format. (cipher=UPPER, plain=lower)")
 
+@guess.error
+async def guess_error(ctx, error):
+    if isinstance(error, (commands.BadArgument, commands.MissingRequiredArgument)):
+        await ctx.send("Incorrect guess or invalid format. (cipher=UPPER, plain=lower)")
+    else:
+        raise error
+
 @bot.command(name='undo')
+@queued
 async def undo(ctx, cipher_char: str):
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
+    puzzle.last_touch = time.monotonic()
     
     if puzzle.undo_guess(cipher_char.upper()):
+        cancel_pending_refresh(ctx.author.id)
         await display_puzzle(ctx)
     else:
         await ctx.send("No guess found for that character.")
 
 @bot.command(name='clear')
+@queued
 async def clear(ctx):
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
+    puzzle.last_touch = time.monotonic()
     
     puzzle.clear_guesses()
+    cancel_pending_refresh(ctx.author.id)
     await display_puzzle(ctx)
 
 @bot.command(name='solve')
+@queued
 async def solve_puzzle(ctx, *, guess_text: str):
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
+    puzzle.last_touch = time.monotonic()
     
     # We'll remove punctuation/spaces to do a simpler comparison.
     # Or you can do a direct string compare if you want to match exactly (but it's more error-prone).
-    def normalize(text):
-        return ''.join(ch for ch in text.lower() if ch.isalnum())
-    
-    guess_norm = normalize(guess_text)
-    plaintext_norm = normalize(puzzle.plaintext)
-    
-    if guess_norm == plaintext_norm:
+    guess_norm = guess_text.lower().translate(_DEL_TABLE)
+
+    # Wrong length can never match; reject before the full compare
+    if len(guess_norm) != len(puzzle.plaintext_norm):
+        await ctx.send("Sorry, that guess doesn't match the actual solution.")
+        return
+
+    if guess_norm == puzzle.plaintext_norm:
         await ctx.send("Congratulations! You've correctly solved the entire puzzle!")
         del active_puzzles[ctx.author.id]
     else:
         await ctx.send("Sorry, that guess doesn't match the actual solution.")
 
 @bot.command(name='addquote')
+@queued
 async def add_quote(ctx, *, quote: str):
-    quotes = load_quotes()
-    quotes.append(quote)
-    save_quotes(quotes)
+    QUOTES.append(quote)
+    # Append the one new line in a worker thread so the write can't
+    # stall the gateway
+    await asyncio.to_thread(append_quote, quote)
     await ctx.send("Quote added successfully!")
 
 # ------------------------------ NEW: !hint and !answer ------------------------------ #
 @bot.command(name='hint')
+@queued
 async def give_hint_command(ctx):
     """
     Reveals one random unguessed letter in the ciphertext.
@@ -219,8 +264,9 @@ async def give_hint_command(ctx):
     """
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
+    puzzle.last_touch = time.monotonic()
     
     hint_result = puzzle.give_hint()
     if not hint_result:
@@ -234,6 +280,9 @@ async def give_hint_command(ctx):
         cipher_char, plain_char = hint_result
         await ctx.send(f"Here's a hint: **{cipher_char}** maps to **{plain_char}**.")
     
+    # Hints flush the display immediately rather than going through the
+    # batching timer
+    cancel_pending_refresh(ctx.author.id)
     if puzzle.is_solved():
         await ctx.send("Congratulations! You've correctly solved the entire puzzle!")
         del active_puzzles[ctx.author.id]
@@ -241,92 +290,135 @@ async def give_hint_command(ctx):
         await display_puzzle(ctx)
 
 @bot.command(name='answer')
+@queued
 async def show_answer(ctx):
     """
     Directly reveals the puzzle's plaintext and ends the puzzle (like 'giving up').
     """
     puzzle = active_puzzles.get(ctx.author.id)
     if not puzzle:
-        await ctx.send("No active puzzle! Use !newpuzzle to start one.")
+        await ctx.send("No active puzzle! Mention me with `newpuzzle` to start one.")
         return
+    puzzle.last_touch = time.monotonic()
     
     await ctx.send(f"The full answer was:\n\n**{puzzle.plaintext}**")
     # Remove the puzzle from active puzzles so user can't keep guessing
+    cancel_pending_refresh(ctx.author.id)
     del active_puzzles[ctx.author.id]
 # ------------------------------------------------------------------------------------ #
 
-@bot.command(name='help')
-async def custom_help(ctx):
+def _build_help_embed():
     """
-    Custom help command that lists all bot commands and their usage.
+    Builds the static help embed listing all bot commands and their usage.
     """
     embed = discord.Embed(title="Codebusters Bot Commands", color=0x00ff00)
-    
+
     embed.add_field(
-        name="!newpuzzle",
+        name="@Codebusters newpuzzle",
         value="Starts a new puzzle from the existing quote database.",
         inline=False
     )
     embed.add_field(
-        name="!guess <CIPHER_CHAR> <PLAIN_CHAR>",
-        value="Guess that the UPPERCASE cipher letter maps to the lowercase plain letter.\nExample: `!guess Q a`.",
+        name="@Codebusters guess <CIPHER_CHAR> <PLAIN_CHAR>",
+        value="Guess that the UPPERCASE cipher letter maps to the lowercase plain letter.\nExample: `@Codebusters guess Q a`.",
         inline=False
     )
     embed.add_field(
-        name="!undo <CIPHER_CHAR>",
-        value="Removes your guess for the specified uppercase cipher letter.\nExample: `!undo Q`.",
+        name="@Codebusters undo <CIPHER_CHAR>",
+        value="Removes your guess for the specified uppercase cipher letter.\nExample: `@Codebusters undo Q`.",
         inline=False
     )
     embed.add_field(
-        name="!clear",
+        name="@Codebusters clear",
         value="Clears **all** of your current letter guesses for the puzzle.",
         inline=False
     )
     embed.add_field(
-        name="!solve <FULL_PLAINTEXT>",
-        value="Attempts to solve the entire puzzle at once by providing a guess for the full phrase.\nExample: `!solve four score and seven years ago`",
+        name="@Codebusters solve <FULL_PLAINTEXT>",
+        value="Attempts to solve the entire puzzle at once by providing a guess for the full phrase.\nExample: `@Codebusters solve four score and seven years ago`",
         inline=False
     )
     embed.add_field(
-        name="!hint",
+        name="@Codebusters hint",
         value="Reveals a single random letter from the unguessed ciphertext.",
         inline=False
     )
     embed.add_field(
-        name="!answer",
+        name="@Codebusters answer",
         value="Reveals the entire plaintext and ends the current puzzle (like giving up).",
         inline=False
     )
     embed.add_field(
-        name="!addquote <QUOTE>",
-        value="Adds a new quote to the quote database. \nExample: `!addquote Life is 10% what happens to you and 90% how you react to it.`",
+        name="@Codebusters addquote <QUOTE>",
+        value="Adds a new quote to the quote database. \nExample: `@Codebusters addquote Life is 10% what happens to you and 90% how you react to it.`",
         inline=False
     )
     embed.add_field(
-        name="!help",
+        name="@Codebusters help",
         value="Displays this help message.",
         inline=False
     )
 
-    await ctx.send(embed=embed)
+    return embed
 
-async def display_puzzle(ctx):
+# The help content is static, so render the embed once at import time
+HELP_EMBED = _build_help_embed()
+
+@bot.command(name='help')
+@queued
+async def custom_help(ctx):
     """
-    Builds and sends an embed showing the puzzle's ciphertext, current guess, and letter frequency.
+    Custom help command that lists all bot commands and their usage.
     """
-    puzzle = active_puzzles[ctx.author.id]
-    ciphertext = puzzle.get_ciphertext()
-    
-    # Build a frequency table
-    freq_counter = Counter(ch for ch in ciphertext if ch.isalpha())
-    freq_str = '\n'.join(f"{letter}: {freq_counter[letter]}" 
-                         for letter in sorted(freq_counter))
+    await ctx.send(embed=HELP_EMBED)
 
+def cancel_pending_refresh(user_id):
+    """
+    Drops any not-yet-fired batched display refresh for this user.
+    """
+    pending = _pending_refresh.pop(user_id, None)
+    if pending:
+        pending.cancel()
+
+def schedule_display(ctx):
+    """
+    Arms (or re-arms) the batching timer: only the last guess in a burst
+    actually triggers a display_puzzle send.
+    """
+    user_id = ctx.author.id
+    cancel_pending_refresh(user_id)
+
+    def flush():
+        _pending_refresh.pop(user_id, None)
+        if user_id in active_puzzles:
+            asyncio.create_task(display_puzzle(ctx))
+
+    _pending_refresh[user_id] = asyncio.get_running_loop().call_later(
+        GUESS_BATCH_DELAY, flush)
+
+def build_puzzle_embed(puzzle):
+    """
+    Pre-renders the display embed for a new puzzle. The cipher-text and
+    frequency fields never change, so only the "Your Guess" field is
+    rewritten before each send (see display_puzzle).
+    """
     embed = discord.Embed(title="Codebusters Puzzle", color=0x00ff00)
-    embed.add_field(name="Cipher Text", value=f"```{ciphertext}```", inline=False)
-    embed.add_field(name="Your Guess", value=f"```{puzzle.get_current_guess()}```", inline=False)
-    embed.add_field(name="Ciphertext Frequency", value=f"```{freq_str}```", inline=False)
-    
-    await ctx.send(embed=embed)
+    embed.add_field(name="Cipher Text", value=f"```{puzzle.ciphertext}```", inline=False)
+    embed.add_field(name="Your Guess", value="...", inline=False)
+    embed.add_field(name="Ciphertext Frequency", value=f"```{puzzle.freq_str}```", inline=False)
+    return embed
+
+async def display_puzzle(ctx):
+    """
+    Builds and sends an embed showing the puzzle's ciphertext, current guess, and letter frequency.
+    """
+    # The puzzle may have been solved/abandoned between a batched flush
+    # being scheduled and this task running; just drop the refresh then
+    puzzle = active_puzzles.get(ctx.author.id)
+    if puzzle is None:
+        return
+    puzzle.embed.set_field_at(1, name="Your Guess",
+                              value=f"```{puzzle.get_current_guess()}```", inline=False)
+    await ctx.send(embed=puzzle.embed)
 
-bot.run('MTMzMTM2OTU2MDcxNjIxODQyOA.GoaUmg.KBEIFATRQvETrShwhpARfre9FuGDrQtD-EbOtw')
\ No newline at end of file
+bot.run(os.environ["DISCORD_TOKEN"])
\ No newline at end of file
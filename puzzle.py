@@ -0,0 +1,159 @@
+"""
+Core substitution-cipher puzzle state.
+
+Kept free of discord imports and fully type-annotated so the module can be
+compiled with mypyc (see setup.py) for the per-character hot paths; the bot
+falls back to this pure-Python version when no compiled extension is built.
+"""
+import os
+import random
+import string
+import time
+from collections import Counter
+
+
+class Puzzle:
+    __slots__ = ('plaintext', 'plaintext_norm', 'cipher_mapping',
+                 'inverse_mapping', 'user_guesses', 'ciphertext', 'freq_str',
+                 '_display_table', '_distinct_cipher_alphas', '_unguessed',
+                 'embed', 'last_touch', '_rng')
+
+    plaintext: str
+    plaintext_norm: str
+    cipher_mapping: dict[str, str]
+    inverse_mapping: dict[str, str]
+    user_guesses: dict[str, str]
+    ciphertext: str
+    freq_str: str
+    _display_table: dict[int, int]
+    _distinct_cipher_alphas: set[str]
+    _unguessed: set[str]
+    # The display embed is owned by the bot layer (see build_puzzle_embed in
+    # bot.py); it's only stored here so the slot exists.
+    embed: object
+    last_touch: float
+    _rng: random.Random
+
+    def __init__(self, plaintext: str) -> None:
+        self.plaintext = plaintext.lower()
+        # Normalized (alnum-only) form used to check full-solve attempts;
+        # fixed per puzzle, so compute it once.
+        self.plaintext_norm = ''.join(c for c in self.plaintext if c.isalnum())
+        self.cipher_mapping = {}
+        self.user_guesses = {}
+        self.last_touch = time.monotonic()
+        self._rng = random.Random(os.urandom(16))
+        self.generate_cipher()
+
+    def generate_cipher(self) -> None:
+        # Shuffle the cipher alphabet as a bytearray: one flat buffer of
+        # codepoints instead of a boxed 26-element list of strings.
+        perm = bytearray(string.ascii_uppercase.encode())
+        self._rng.shuffle(perm)
+        shuffled = bytes(perm).decode()
+        self.cipher_mapping = dict(zip(string.ascii_lowercase, shuffled))
+        # Inverse (cipher -> plain) lookup so guesses and hints don't have
+        # to scan cipher_mapping to invert it.
+        self.inverse_mapping = {v: k for k, v in self.cipher_mapping.items()}
+        # The mapping never changes after construction, so encrypt once up
+        # front instead of rebuilding the ciphertext on every command.
+        self.ciphertext = self.plaintext.translate(
+            str.maketrans(string.ascii_lowercase, shuffled))
+        # Translation table used to render the player's progress: every
+        # cipher letter starts as '_' and is replaced by the plaintext
+        # letter once guessed. Non-alpha chars aren't in the table, so
+        # str.translate passes them through unchanged.
+        self._display_table = {ord(c): ord('_') for c in shuffled}
+        # Distinct cipher letters actually present in the puzzle; solving
+        # means guessing each of these exactly once.
+        self._distinct_cipher_alphas = {c for c in self.ciphertext if c.isalpha()}
+        # Live set of cipher letters not yet guessed, kept in sync by
+        # make_guess/undo_guess/clear_guesses so give_hint never has to
+        # rescan the ciphertext.
+        self._unguessed = set(self._distinct_cipher_alphas)
+        # Letter frequencies are fixed for the life of the puzzle, so
+        # render the table once here rather than on every display.
+        counts = Counter(c for c in self.ciphertext if c.isalpha())
+        self.freq_str = '\n'.join(f"{letter}: {counts[letter]}"
+                                  for letter in sorted(counts))
+
+    def get_ciphertext(self) -> str:
+        return self.ciphertext
+
+    def get_current_guess(self) -> str:
+        """
+        Return a string showing underscores for unguessed letters,
+        and the correct lowercase letter for any correctly guessed letters.
+        Non-alpha chars remain as-is.
+        """
+        return self.ciphertext.translate(self._display_table)
+
+    def make_guess(self, cipher_char: str, plain_char: str) -> bool:
+        """
+        Checks if cipher_char (uppercase) actually maps to plain_char (lowercase).
+        If correct, store in user_guesses and return True, otherwise False.
+        Callers are expected to normalize case.
+        """
+        # Letters that never occur in the ciphertext can't be guessed;
+        # accepting them would inflate user_guesses past the letters the
+        # puzzle actually needs.
+        if cipher_char not in self._distinct_cipher_alphas:
+            return False
+
+        # Identify correct plaintext letter for this cipher_char
+        if self.inverse_mapping.get(cipher_char) == plain_char:
+            self.user_guesses[cipher_char] = plain_char
+            self._display_table[ord(cipher_char)] = ord(plain_char)
+            self._unguessed.discard(cipher_char)
+            return True
+        return False
+
+    def undo_guess(self, cipher_char: str) -> bool:
+        """
+        Removes a single-letter guess if it exists in user_guesses.
+        """
+        if cipher_char in self.user_guesses:
+            del self.user_guesses[cipher_char]
+            self._display_table[ord(cipher_char)] = ord('_')
+            # Only letters actually in the puzzle belong in _unguessed;
+            # otherwise give_hint could reveal a letter the player never
+            # sees and that doesn't count toward completion.
+            if cipher_char in self._distinct_cipher_alphas:
+                self._unguessed.add(cipher_char)
+            return True
+        return False
+
+    def clear_guesses(self) -> None:
+        """
+        Clears all guesses.
+        """
+        self.user_guesses.clear()
+        for code in self._display_table:
+            self._display_table[code] = ord('_')
+        self._unguessed = set(self._distinct_cipher_alphas)
+
+    def is_solved(self) -> bool:
+        """
+        Returns True if every cipher letter in the puzzle has been guessed.
+        Guesses are only stored when correct, so covering the distinct
+        cipher letters means the plaintext is fully recovered.
+        """
+        return self._distinct_cipher_alphas <= self.user_guesses.keys()
+
+    def give_hint(self) -> tuple[str, str] | None:
+        """
+        Reveals ONE random letter that hasn't been guessed yet.
+        Returns (cipher_char, plain_char) if a letter was revealed, or None if no hint is possible.
+        """
+        if not self._unguessed:
+            return None  # No letters to reveal
+
+        # Randomly choose one unguessed cipher character
+        chosen_cipher = self._rng.choice(tuple(self._unguessed))
+
+        # Reveal the correct plaintext letter for that cipher character
+        plain_char = self.inverse_mapping[chosen_cipher]
+        self.user_guesses[chosen_cipher] = plain_char
+        self._display_table[ord(chosen_cipher)] = ord(plain_char)
+        self._unguessed.discard(chosen_cipher)
+        return (chosen_cipher, plain_char)
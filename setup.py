@@ -0,0 +1,19 @@
+"""
+Optional mypyc build for the puzzle hot paths.
+
+Run `pip install mypy && python setup.py build_ext --inplace` to compile
+puzzle.py to a C extension; bot.py works unchanged either way since the
+import path is the same.
+"""
+from setuptools import setup
+
+try:
+    from mypyc.build import mypycify
+    ext_modules = mypycify(['puzzle.py'])
+except ImportError:
+    ext_modules = []
+
+setup(
+    name='codebustersbot',
+    ext_modules=ext_modules,
+)